@@ -0,0 +1,73 @@
+import numpy as np
+
+# Lazy filter plan over the content catalog.
+#
+# Filters are collected as predicates and only evaluated when a result is needed.
+# The plan keeps the row positions that match everything evaluated so far, so each
+# new predicate only looks at surviving rows and no intermediate DataFrames are built.
+#
+# The app's widgets cascade: each one builds its options from the rows left by the
+# filters above it, so predicates are evaluated widget by widget rather than as one
+# combined mask. When several are pending at once, the text search, which is the
+# expensive one, runs after the column filters.
+
+SEARCH_COLUMNS = ('title', 'subject', 'chapter')
+
+
+class ContentQuery:
+    def __init__(self, base):
+        self.base = base
+        self._positions = np.arange(len(base))
+        self._pending = []
+
+    def where_in(self, column, values):
+        values = list(values)
+        if values:
+            self._pending.append(('in', column, values))
+        return self
+
+    def where_eq(self, column, value):
+        return self.where_in(column, [value])
+
+    def search(self, text, columns=SEARCH_COLUMNS):
+        # Case-insensitive substring match in any of the columns
+        if text:
+            self._pending.append(('search', tuple(columns), text.lower()))
+        return self
+
+    def positions(self):
+        if self._pending:
+            pending = sorted(self._pending, key=lambda predicate: predicate[0] == 'search')
+            for predicate in pending:
+                if not len(self._positions):
+                    break
+                self._positions = self._positions[self._evaluate(predicate, self._positions)]
+            self._pending = []
+        return self._positions
+
+    def count(self):
+        return len(self.positions())
+
+    def column(self, name):
+        # A single column for the matching rows, e.g. to build the options of the next widget
+        return self.base[name].take(self.positions())
+
+    def page(self, start=0, stop=None, sort_by=None, ascending=True, columns=None):
+        # Only the rows in [start, stop) of the (optionally sorted) result are materialized
+        positions = self.positions()
+        if sort_by is not None:
+            keys = self.base[sort_by].take(positions).reset_index(drop=True)
+            order = keys.sort_values(ascending=ascending, kind='stable').index.to_numpy()
+            positions = positions[order]
+        rows = self.base.iloc[positions[start:stop]]
+        return rows if columns is None else rows[list(columns)]
+
+    def _evaluate(self, predicate, positions):
+        kind, target, value = predicate
+        if kind == 'in':
+            return self.base[target].take(positions).isin(value).to_numpy(dtype=bool)
+        mask = np.zeros(len(positions), dtype=bool)
+        for column in target:
+            text = self.base[column].take(positions).astype(str).str.lower()
+            mask |= text.str.contains(value, regex=False).to_numpy(dtype=bool)
+        return mask
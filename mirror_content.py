@@ -0,0 +1,303 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import unquote, urlparse
+
+import requests
+
+# Mirrors the files referenced by all_content_offline.json into a local directory
+# that is served as the offline server's document root (http://172.18.96.1).
+#
+# Usage:
+#   python mirror_content.py --dest /var/www/html
+#   python mirror_content.py --dest ./mirror --source-base http://127.0.0.1:8000 --workers 4
+#
+# Files are downloaded to "<path>.part" first and resumed with an HTTP Range request
+# if a previous run was interrupted. Every completed file is recorded in a manifest
+# (file_id or local path -> path, url, size, sha256), so reruns only fetch what is new
+# or changed.
+
+ONLINE_CATALOG = 'all_content_online.json'
+OFFLINE_CATALOG = 'all_content_offline.json'
+OFFLINE_BASE = 'http://172.18.96.1'
+SOURCE_BASE = 'https://pustakalaya.org'
+# Uploaded files live under this path on both servers; anything else (E-Paath, PhET)
+# is an application that is deployed separately
+MEDIA_PREFIX = '/media/'
+MANIFEST_NAME = 'mirror_manifest.json'
+CHUNK_SIZE = 1024 * 1024
+# The manifest is saved after this many completed downloads or seconds, whichever comes first
+SAVE_EVERY = 20
+SAVE_INTERVAL = 10.0
+
+
+def load_catalog(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def plan_files(online, offline, offline_base=OFFLINE_BASE, source_base=SOURCE_BASE):
+    # Pair online and offline records by content_id and collect one entry per file.
+    # Files are keyed by file_id; books without a file_id are keyed by their local path.
+    online_ids = {row['content_id'] for row in online}
+    offline_host = urlparse(offline_base).netloc
+    files = {}
+    offline_ids = {row['content_id'] for row in offline}
+    missing_offline = sorted(content_id for content_id in online_ids - offline_ids if content_id)
+
+    for row in offline:
+        if row['content_id'] not in online_ids:
+            continue
+        link = urlparse(row['content_link'])
+        if link.netloc != offline_host or not link.path.startswith(MEDIA_PREFIX):
+            continue
+        path = unquote(link.path).lstrip('/')
+        file_id = row.get('file_id')
+        key = file_id if file_id and file_id != 'NA' else path
+        files[key] = {
+            'path': path,
+            'url': source_base.rstrip('/') + link.path,
+        }
+    return files, missing_offline
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    # Write to a temporary file first so an interrupted run never leaves a broken manifest
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_up_to_date(entry, recorded, dest, verify=False):
+    if not recorded or recorded.get('url') != entry['url'] or recorded.get('path') != entry['path']:
+        return False
+    local_path = os.path.join(dest, entry['path'])
+    if not os.path.isfile(local_path) or os.path.getsize(local_path) != recorded.get('size'):
+        return False
+    if verify:
+        return sha256_file(local_path) == recorded.get('sha256')
+    return True
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def download_file(session, entry, dest, timeout=60, cancel=None):
+    # cancel is a threading.Event; once set, the download stops after the current chunk and
+    # leaves the .part and validator files in place so the next run can resume
+    local_path = os.path.join(dest, entry['path'])
+    part_path = local_path + '.part'
+    # ETag or Last-Modified of the response the .part file was started from
+    validator_path = part_path + '.validator'
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = _read_validator(validator_path) if offset else None
+    # Without a validator there is no way to tell if the remote file changed, so start over
+    if not validator:
+        offset = 0
+    # Ask for the raw bytes: sizes and Range offsets refer to the encoded body, so a gzip
+    # response would never match Content-Length and could not be resumed safely
+    headers = {'Accept-Encoding': 'identity'}
+    if offset:
+        headers.update({'Range': f'bytes={offset}-', 'If-Range': validator})
+
+    with session.get(entry['url'], headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # Range starts at or past the end: only complete if the sizes actually match
+            expected_size = _content_range_total(response.headers.get('Content-Range'))
+            if expected_size != offset:
+                _remove(part_path, validator_path)
+                return download_file(session, entry, dest, timeout=timeout, cancel=cancel)
+        else:
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range')
+            if response.status_code == 206:
+                if _content_range_start(content_range) != offset:
+                    _remove(part_path, validator_path)
+                    return download_file(session, entry, dest, timeout=timeout, cancel=cancel)
+                mode = 'ab'
+                expected_size = _content_range_total(content_range)
+            else:
+                # Server ignored the Range header or the file changed, start over
+                mode = 'wb'
+                offset = 0
+                expected_size = None
+                _write_validator(validator_path, response.headers)
+            length = _int_header(response.headers.get('Content-Length'))
+            if expected_size is None and length is not None:
+                expected_size = offset + length
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled(entry['url'])
+                    f.write(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        _remove(part_path, validator_path)
+        raise IOError(f"Size mismatch for {entry['url']}: expected {expected_size} bytes, got {size}")
+
+    sha256 = sha256_file(part_path)
+    os.replace(part_path, local_path)
+    _remove(validator_path)
+    return {'path': entry['path'], 'url': entry['url'], 'size': size, 'sha256': sha256}
+
+
+def _read_validator(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def _write_validator(path, headers):
+    # Weak ETags cannot be used with If-Range, fall back to Last-Modified for those
+    etag = headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+    if validator:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(validator)
+    else:
+        _remove(path)
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _int_header(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _content_range_start(content_range):
+    # "bytes 100-199/200" -> 100
+    if not content_range or ' ' not in content_range:
+        return None
+    return _int_header(content_range.split(' ', 1)[1].split('-', 1)[0])
+
+
+def _content_range_total(content_range):
+    # "bytes 100-199/200" or "bytes */200" -> 200; returns None when the total is unknown ("*")
+    if not content_range or '/' not in content_range:
+        return None
+    return _int_header(content_range.rsplit('/', 1)[1].strip())
+
+
+def mirror(files, dest, manifest_path, workers=8, verify=False, timeout=60, log=print):
+    manifest = load_manifest(manifest_path)
+    pending = {
+        key: entry for key, entry in files.items()
+        if not is_up_to_date(entry, manifest.get(key), dest, verify=verify)
+    }
+    log(f"{len(files)} files in catalog, {len(files) - len(pending)} up to date, {len(pending)} to fetch")
+
+    failed = {}
+    local = threading.local()
+    cancel = threading.Event()
+
+    def fetch(entry):
+        # requests.Session is not thread safe, so every worker keeps its own
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        if cancel.is_set():
+            raise DownloadCancelled(entry['url'])
+        return download_file(local.session, entry, dest, timeout=timeout, cancel=cancel)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    unsaved = 0
+    last_save = time.time()
+    try:
+        futures = {executor.submit(fetch, entry): key for key, entry in pending.items()}
+        for done, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                record = future.result()
+            except (requests.RequestException, OSError, ValueError) as e:
+                failed[key] = str(e)
+                log(f"[{done}/{len(pending)}] FAILED {pending[key]['url']}: {e}")
+                continue
+            manifest[key] = record
+            unsaved += 1
+            log(f"[{done}/{len(pending)}] {record['path']}")
+            if unsaved >= SAVE_EVERY or time.time() - last_save >= SAVE_INTERVAL:
+                save_manifest(manifest_path, manifest)
+                unsaved = 0
+                last_save = time.time()
+    except KeyboardInterrupt:
+        # Drop queued downloads and stop the running ones after their current chunk;
+        # they keep their .part files for the next run
+        log("Interrupted, stopping downloads")
+        cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=False)
+        save_manifest(manifest_path, manifest)
+
+    return manifest, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror offline catalog content from the online source.")
+    parser.add_argument('--dest', required=True, help="Document root of the offline server")
+    parser.add_argument('--online', default=ONLINE_CATALOG, help="Online catalog JSON")
+    parser.add_argument('--offline', default=OFFLINE_CATALOG, help="Offline catalog JSON")
+    parser.add_argument('--offline-base', default=OFFLINE_BASE, help="Base URL used by offline content links")
+    parser.add_argument('--source-base', default=SOURCE_BASE, help="Base URL to download files from")
+    parser.add_argument('--manifest', default=None, help=f"Manifest path (default: <dest>/{MANIFEST_NAME})")
+    parser.add_argument('--workers', type=int, default=8, help="Number of parallel downloads")
+    parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument('--verify', action='store_true', help="Re-hash existing files against the manifest")
+    args = parser.parse_args(argv)
+
+    files, missing_offline = plan_files(
+        load_catalog(args.online), load_catalog(args.offline),
+        offline_base=args.offline_base, source_base=args.source_base,
+    )
+    if missing_offline:
+        print(f"{len(missing_offline)} online content items have no offline counterpart")
+
+    os.makedirs(args.dest, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.dest, MANIFEST_NAME)
+    try:
+        _, failed = mirror(files, args.dest, manifest_path, workers=args.workers, verify=args.verify, timeout=args.timeout)
+    except KeyboardInterrupt:
+        print("Interrupted, rerun to resume")
+        return 130
+
+    if failed:
+        print(f"{len(failed)} files failed, rerun to retry")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,10 @@ import pandas as pd
 import json
 import streamlit as st
 import base64
+import hashlib
 import requests
+from content_query import ContentQuery
+from usage_analytics import AnalyticsRecorder, load_popularity
 
 # change to True for offline server
 for_offline_use = False 
@@ -30,14 +33,12 @@ def get_base64_image(image_path):
             encoded_string = base64.b64encode(image_file.read()).decode()
         return encoded_string
 
-# Read all content including additional content from the JSON file
-if for_offline_use:
-    df = pd.read_json('all_content_offline.json', orient='records')
-else:
-    df = pd.read_json('all_content_online.json', orient='records')
+# One analytics recorder per server process, shared by all sessions
+@st.cache_resource
+def get_analytics_recorder():
+    return AnalyticsRecorder()
 
-# Fill NaN values with empty strings
-df = df.fillna('')
+analytics = get_analytics_recorder()
 
 
 # Define label translations
@@ -67,6 +68,7 @@ labels = {
     "learn_now_text" : {"English": "Learn now >>", "Nepali": "सिकौँ >>"},
     "ascending_text" : {"English": "Ascending Order", "Nepali": "बढ्दो क्रम"},
     "sort_by_text" : {"English": "Sort by :", "Nepali": "क्रमबद्ध सूची निर्माण गर्ने विकल्प :"},
+    "open_content_text" : {"English": "Opening content", "Nepali": "सामग्री खोल्दै"},
 }
 
 
@@ -108,12 +110,56 @@ def parse_language(df, language):
         df['chapter'] = df['chapter'].apply(lambda x: x.split('[[')[1].split(']]')[0].strip() if '[[' in x else x)
     return df
 
-# Apply language parsing
-df = parse_language(df, language)
+# Base catalog for one language, prepared once and shared by all sessions.
+# It is never modified after loading; filters run through ContentQuery instead.
+# Popularity scores are aggregated in the background, so rebuilding every few minutes is enough.
+@st.cache_resource(ttl=300)
+def load_catalog(for_offline_use, language):
+    # Read all content including additional content from the JSON file
+    if for_offline_use:
+        df = pd.read_json('all_content_offline.json', orient='records')
+    else:
+        df = pd.read_json('all_content_online.json', orient='records')
+
+    # Fill NaN values with empty strings
+    df = df.fillna('')
+
+    # Apply language parsing
+    df = parse_language(df, language)
+
+    # Translate content types and sources
+    df['type'] = df['type'].map(lambda x: content_type_source_labels.get(x, {}).get(language, x))
+    df['content_source'] = df['content_source'].map(lambda x: content_type_source_labels.get(x, {}).get(language, x))
 
-# Translate content types and sources
-df['type'] = df['type'].map(lambda x: content_type_source_labels.get(x, {}).get(language, x))
-df['content_source'] = df['content_source'].map(lambda x: content_type_source_labels.get(x, {}).get(language, x))
+    # Convert grades to integers for display purposes (ignoring NaN values)
+    df['grade'] = pd.to_numeric(df['grade'], errors='coerce').astype('Int64')  # Use 'Int64' to allow for NaN values
+
+    # Popularity score per content_id, 0 for content nobody has opened yet
+    df['popularity'] = df['content_id'].map(load_popularity()).fillna(0.0)
+
+    # content_id is shared by several cards (and empty for books), so the "Learn now" redirect
+    # uses a key derived from both content_id and content_link to find the exact card
+    df['card_key'] = [
+        hashlib.sha1(f"{content_id}|{link}".encode('utf-8')).hexdigest()[:16] if link else ''
+        for content_id, link in zip(df['content_id'], df['content_link'])
+    ]
+    return df
+
+df = load_catalog(for_offline_use, language)
+query = ContentQuery(df)
+
+# "Learn now" links point back to the app with ?open=<card_key> so the click can be recorded
+# before the student is sent on to the content itself
+open_card_key = st.query_params.get("open")
+if open_card_key:
+    opened = df[df['card_key'] == open_card_key]
+    if not opened.empty:
+        row = opened.iloc[0]
+        analytics.record(row['content_id'], 'click')
+        st.write(f"### {labels['open_content_text'][language]}: {row['title']}")
+        st.markdown(f'<meta http-equiv="refresh" content="0; url={row["content_link"]}">', unsafe_allow_html=True)
+        st.link_button(labels["learn_now_text"][language], row['content_link'], type='primary')
+        st.stop()
 
 
 # Search bar for content cards or table view
@@ -129,44 +175,39 @@ reset_button = col2Side.button(labels["reset_btn_text"][language], key="reset_bt
 
 # Apply search filter if search button is clicked
 if search_button or search_query:
-    df = df[df.apply(lambda row: search_query.lower() in str(row['title']).lower() or search_query.lower() in str(row['subject']).lower() or search_query.lower() in str(row['chapter']).lower(), axis=1)]
+    query.search(search_query)
 
 
 # grades 6-10 only
-# Convert grades to integers (if possible), ignoring any errors that might occur
-# Convert grades to integers for display purposes (ignoring NaN values)
-df['grade'] = pd.to_numeric(df['grade'], errors='coerce').astype('Int64')  # Use 'Int64' to allow for NaN values
-
-# grades 6-10 only
-grade_options = [labels["all_text"][language]] + [int(g) for g in df['grade'].dropna().unique() if g <= 10]
+grade_options = [labels["all_text"][language]] + [int(g) for g in query.column('grade').dropna().unique() if g <= 10]
 selected_grades = st.sidebar.multiselect(labels["select_grade"][language], options=grade_options, key="grade_filter_main", placeholder=labels["choose_an_option"][language])
 
 if selected_grades:
-    df = df[df['grade'].isin(selected_grades)]
+    query.where_in('grade', selected_grades)
 
 
 # Filter by Subject
-subject_options = [labels["all_text"][language]] + list(df['subject'].unique())
+subject_options = [labels["all_text"][language]] + list(query.column('subject').unique())
 subject_filter = st.sidebar.selectbox(labels["select_subject"][language], options=subject_options, index=0, key="subject_filter_main", placeholder=labels["choose_an_option"][language])
 if subject_filter != labels["all_text"][language]:
-    df = df[df['subject'] == subject_filter]
+    query.where_eq('subject', subject_filter)
 
 # Filter by Chapter
 # Multi-select for Chapter
-chapter_options = list(df['chapter'].unique())
+chapter_options = list(query.column('chapter').unique())
 selected_chapters = st.sidebar.multiselect(labels["select_chapter"][language], options=chapter_options, key="chapters_select_main",placeholder=labels["choose_an_option"][language])
 if selected_chapters:
-    df = df[df['chapter'].isin(selected_chapters)]
+    query.where_in('chapter', selected_chapters)
 
-content_types = df['type'].unique()
+content_types = query.column('type').unique()
 selected_types = st.sidebar.multiselect(labels["select_content_type"][language], content_types, default=content_types, key="type_select_main",placeholder=labels["choose_an_option"][language])
 if selected_types:
-    df = df[df['type'].isin(selected_types)]
+    query.where_in('type', selected_types)
 
-content_sources = df['content_source'].unique()
+content_sources = query.column('content_source').unique()
 selected_sources = st.sidebar.multiselect(labels["select_content_source"][language], content_sources, default=content_sources, key="source_select_main",placeholder=labels["choose_an_option"][language])
 if selected_sources:
-    df = df[df['content_source'].isin(selected_sources)]
+    query.where_in('content_source', selected_sources)
 
 
 # selection of view
@@ -186,7 +227,10 @@ reset_button1 = col2.button(labels["reset_btn_text"][language], key="reset_btn_m
 
 # Apply search filter if search button is clicked or search query present (hit enter)
 if search_button1 or search_query1:
-    df = df[df.apply(lambda row: search_query1.lower() in str(row['title']).lower() or search_query1.lower() in str(row['subject']).lower() or search_query1.lower() in str(row['chapter']).lower(), axis=1)]
+    query.search(search_query1)
+
+# Run all collected filters once
+total_content = query.count()
 
 
 # View selection buttons
@@ -208,6 +252,10 @@ column_labels = {
         'English': 'Chapter',
         'Nepali': 'पाठ'
     },
+    'popularity': {
+        'English': 'Popularity',
+        'Nepali': 'लोकप्रियता'
+    },
     'content_link': {
         'English': 'Content Link',
         'Nepali': 'सामग्री लिङ्क'
@@ -219,12 +267,13 @@ sort_options = {
     column_labels['title'][language]: 'title',
     column_labels['grade'][language]: 'grade',
     column_labels['subject'][language]: 'subject',
-    column_labels['chapter'][language]: 'chapter'
+    column_labels['chapter'][language]: 'chapter',
+    column_labels['popularity'][language]: 'popularity'
 }
 
 if navigation_choice == labels["table_view_label"][language]:
     # Display filtered table with specific columns
-    st.write(f"### {labels['total_content'][language]}: {len(df)}")
+    st.write(f"### {labels['total_content'][language]}: {total_content}")
 
     # Allow sorting by specific columns using displayed labels
     sort_column_label = st.selectbox(labels["sort_by_text"][language], list(sort_options.keys()))
@@ -233,23 +282,22 @@ if navigation_choice == labels["table_view_label"][language]:
     # Get the actual column name from the selected label
     sort_column = sort_options[sort_column_label]
 
-    # Sort the DataFrame using actual column names
-    sorted_df = df.sort_values(by=sort_column, ascending=ascending)
-
     # Get the displayed column names for the sorted DataFrame
     displayed_columns = [
         column_labels['title'][language],
         column_labels['grade'][language],
         column_labels['subject'][language],
         column_labels['chapter'][language],
-        column_labels['content_link'][language]
+        column_labels['content_link'][language],
+        column_labels['popularity'][language]
     ]
 
     # Create a list of the actual DataFrame column names
-    actual_columns = ['title', 'grade', 'subject', 'chapter', 'content_link']
+    actual_columns = ['title', 'grade', 'subject', 'chapter', 'content_link', 'popularity']
 
-    # Display the sorted DataFrame using the actual column names
-    st.write(sorted_df[actual_columns].rename(columns=dict(zip(actual_columns, displayed_columns))))
+    # Sort the matching rows using actual column names and display them
+    sorted_df = query.page(sort_by=sort_column, ascending=ascending, columns=actual_columns)
+    st.write(sorted_df.rename(columns=dict(zip(actual_columns, displayed_columns))))
 
     # Add a download button for CSV
     #csv_data = sorted_df.to_csv(index=False).encode('utf-8')
@@ -268,12 +316,20 @@ elif navigation_choice == labels["card_view_label"][language]:
         st.session_state.card_limit += load_more_increment
 
     # Display current batch of cards
-    end_idx = min(st.session_state.card_limit, len(df))
-    cards = df.iloc[:end_idx]
+    # Most opened content first; stable sort keeps catalog order for equal scores
+    end_idx = min(st.session_state.card_limit, total_content)
+    cards = query.page(0, end_idx, sort_by='popularity', ascending=False)
+
+    # Count each card once per session, not on every rerun
+    if "viewed_content" not in st.session_state:
+        st.session_state.viewed_content = set()
+    new_views = set(cards['content_id']) - st.session_state.viewed_content - {''}
+    analytics.record_many(new_views, 'view')
+    st.session_state.viewed_content |= new_views
     
     # Display content cards
     #st.write("## Content Cards")
-    st.write(f"### {labels['total_content'][language]}: {len(df)}, {labels['displayed_label'][language]}: {end_idx}")
+    st.write(f"### {labels['total_content'][language]}: {total_content}, {labels['displayed_label'][language]}: {end_idx}")
 
     # Define icons for different content types
     content_type_icons = {
@@ -308,7 +364,7 @@ elif navigation_choice == labels["card_view_label"][language]:
                         <p><img src="data:image/png;base64,{get_base64_image(icon_path) if icon_path != '' else 'N'}" height="40" width="40" alt="Content Type"/><strong> {row['content_source']}</strong></p>
                         <h5>{row['title']}</h5>
                         <p>{labels["grade_text_only"][language]} {row['grade']}, {row['subject']}, {row['chapter']}</p>
-                        <p><a href="{row['content_link']}" target="_blank">{labels["learn_now_text"][language]}</a></p>
+                        <p><a href="{'?open=' + row['card_key'] if row['card_key'] else row['content_link']}" target="_blank">{labels["learn_now_text"][language]}</a></p>
                         <!--{'<p><strong>Not in Gradewise</strong></p>' if row.get('not_in_gradewise') == 'Yes' else ''}-->
                     </div>
                 """
@@ -316,12 +372,12 @@ elif navigation_choice == labels["card_view_label"][language]:
     
     # Info line showing loaded content count
     if language == "English":
-        st.write(f"Loaded {end_idx} out of {len(df)} content")
+        st.write(f"Loaded {end_idx} out of {total_content} content")
     else:
-        st.write(f"जम्मा सामग्री: {len(df)}, देखाइएको सामग्री: {end_idx} ")
+        st.write(f"जम्मा सामग्री: {total_content}, देखाइएको सामग्री: {end_idx} ")
     # Button to load more cards
     load_more_cards()
-    if end_idx < len(df):
+    if end_idx < total_content:
         if st.button(labels["load_more"][language]):
             load_more_cards()
 
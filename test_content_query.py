@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from content_query import SEARCH_COLUMNS, ContentQuery
+
+# ContentQuery is checked against a plain boolean mask over the same catalog, built the
+# way streamlit_app.py builds its English base catalog.
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    df = pd.read_json('all_content_online.json', orient='records').fillna('')
+    for column in ('subject', 'chapter'):
+        df[column] = df[column].apply(lambda x: x.split('[')[0].strip())
+    df['grade'] = pd.to_numeric(df['grade'], errors='coerce').astype('Int64')
+    return df
+
+
+def search_mask(df, text):
+    mask = np.zeros(len(df), dtype=bool)
+    for column in SEARCH_COLUMNS:
+        mask |= df[column].astype(str).str.lower().str.contains(text.lower(), regex=False).to_numpy()
+    return mask
+
+
+def test_search_combined_with_all_filters(catalog):
+    # Search terms and filter values are taken from a real row so the result is not empty;
+    # the upper-cased English subject name checks that search ignores case
+    rows = catalog[(catalog['grade'] == 8) & (catalog['type'] == 'video') & catalog['subject'].str.isascii()]
+    row = rows.iloc[0]
+    subject = row['subject']
+    chapters = list(catalog.loc[catalog['subject'] == subject, 'chapter'].unique()[:3]) + [row['chapter']]
+    types = ['video', 'document']
+    sources = list(catalog['content_source'].unique())
+    first_search, second_search = subject[:4].upper(), row['title'][:2]
+
+    query = (
+        ContentQuery(catalog)
+        .search(first_search)
+        .where_in('grade', [8, 9])
+        .where_eq('subject', subject)
+        .where_in('chapter', chapters)
+        .where_in('type', types)
+        .where_in('content_source', sources)
+        .search(second_search)
+    )
+    mask = (
+        search_mask(catalog, first_search)
+        & catalog['grade'].isin([8, 9]).to_numpy(dtype=bool)
+        & (catalog['subject'] == subject).to_numpy()
+        & catalog['chapter'].isin(chapters).to_numpy()
+        & catalog['type'].isin(types).to_numpy()
+        & catalog['content_source'].isin(sources).to_numpy()
+        & search_mask(catalog, second_search)
+    )
+    expected = catalog[mask]
+
+    assert len(expected) > 0
+    assert query.count() == len(expected)
+    assert query.page().equals(expected)
+
+
+def test_cascading_options_match_partial_filters(catalog):
+    query = ContentQuery(catalog).search('set')
+    expected = catalog[search_mask(catalog, 'set')]
+    assert list(query.column('grade').dropna().unique()) == list(expected['grade'].dropna().unique())
+
+    query.where_in('grade', [6])
+    expected = expected[expected['grade'].isin([6])]
+    assert list(query.column('subject').unique()) == list(expected['subject'].unique())
+
+
+def test_grade_with_missing_values(catalog):
+    base = catalog.copy()
+    base.loc[base.index[::7], 'grade'] = pd.NA
+    assert base['grade'].isna().any()
+
+    query = ContentQuery(base)
+    assert query.column('grade').isna().sum() == base['grade'].isna().sum()
+
+    query.where_in('grade', [6, 7])
+    expected = base[base['grade'].isin([6, 7]).to_numpy(dtype=bool)]
+    assert query.count() == len(expected)
+    assert query.page().equals(expected)
+    assert not query.column('grade').isna().any()
+
+
+def test_no_matching_rows(catalog):
+    query = ContentQuery(catalog).where_eq('subject', 'No such subject').search('a')
+    assert query.count() == 0
+    assert query.column('chapter').empty
+    page = query.page(0, 30, sort_by='title', columns=['title', 'grade'])
+    assert page.empty
+    assert list(page.columns) == ['title', 'grade']
+
+
+def test_page_slices_after_stable_descending_sort(catalog):
+    query = ContentQuery(catalog).where_in('type', ['video'])
+    expected = catalog[catalog['type'] == 'video'].sort_values(by='grade', ascending=False, kind='stable')
+
+    assert query.page(10, 40, sort_by='grade', ascending=False).equals(expected.iloc[10:40])
+    assert query.page(0, 5).equals(catalog[catalog['type'] == 'video'].iloc[:5])
+    assert query.page(0, 5, columns=['title']).equals(catalog.loc[catalog['type'] == 'video', ['title']].iloc[:5])
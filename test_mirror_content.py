@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+
+import pytest
+import requests
+
+import mirror_content
+
+# Stand-in for the upstream server: serves files from a dict with ETag, Range and If-Range
+# support and logs the request headers it receives. Paths in server.gzip_paths are sent
+# gzip-encoded whenever the client accepts it.
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            body = body[start:]
+        elif self.path in self.server.gzip_paths and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            body = gzip.compress(body)
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.files = {
+        '/media/uploads/videos/lesson.mp4': os.urandom(300000),
+        '/media/uploads/op/pdf/book.pdf': os.urandom(5000),
+    }
+    httpd.requests = []
+    httpd.gzip_paths = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def catalogs(tmp_path):
+    online = [
+        {'content_id': 'c1', 'file_id': 'f1', 'content_link': 'https://www.youtube.com/watch?v=x'},
+        {'content_id': None, 'file_id': None, 'content_link': 'https://pustakalaya.org/media/uploads/op/pdf/book.pdf'},
+        {'content_id': 'c2', 'file_id': 'NA', 'content_link': 'https://epaath.olenepal.org/start.html'},
+        {'content_id': 'c3', 'file_id': 'NA', 'content_link': 'https://phet.colorado.edu/sim'},
+    ]
+    offline = [
+        {'content_id': 'c1', 'file_id': 'f1', 'content_link': 'http://172.18.96.1/media/uploads/videos/lesson.mp4'},
+        {'content_id': None, 'file_id': None, 'content_link': 'http://172.18.96.1/media/uploads/op/pdf/book.pdf'},
+        {'content_id': 'c2', 'file_id': 'NA', 'content_link': 'http://172.18.96.1/epaath/start.html'},
+        {'content_id': 'c3', 'file_id': 'NA', 'content_link': 'http://172.18.96.1:82/learn/sim'},
+    ]
+    for name, rows in (('online.json', online), ('offline.json', offline)):
+        (tmp_path / name).write_text(json.dumps(rows), encoding='utf-8')
+
+
+def run(tmp_path, server, *extra):
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    return mirror_content.main([
+        '--dest', str(tmp_path / 'dest'),
+        '--online', str(tmp_path / 'online.json'),
+        '--offline', str(tmp_path / 'offline.json'),
+        '--source-base', base,
+        '--workers', '2',
+        *extra,
+    ])
+
+
+def local(tmp_path, path):
+    return tmp_path / 'dest' / path.lstrip('/')
+
+
+def test_plan_skips_applications_and_keys_books_by_path(tmp_path):
+    catalogs(tmp_path)
+    files, _ = mirror_content.plan_files(
+        mirror_content.load_catalog(tmp_path / 'online.json'),
+        mirror_content.load_catalog(tmp_path / 'offline.json'),
+    )
+    assert sorted(files) == ['f1', 'media/uploads/op/pdf/book.pdf']
+
+
+def test_fresh_download_and_up_to_date_rerun(tmp_path, server):
+    catalogs(tmp_path)
+    assert run(tmp_path, server) == 0
+    for path, body in server.files.items():
+        assert local(tmp_path, path).read_bytes() == body
+
+    manifest = json.loads((tmp_path / 'dest' / mirror_content.MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest['f1']['sha256'] == hashlib.sha256(server.files['/media/uploads/videos/lesson.mp4']).hexdigest()
+
+    server.requests.clear()
+    assert run(tmp_path, server) == 0
+    assert server.requests == []
+
+
+def test_resume_from_partial_download(tmp_path, server):
+    catalogs(tmp_path)
+    path = '/media/uploads/videos/lesson.mp4'
+    body = server.files[path]
+    part = local(tmp_path, path + '.part')
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body[:1000])
+    etag = '"%s"' % hashlib.md5(body).hexdigest()
+    local(tmp_path, path + '.part.validator').write_text(etag, encoding='utf-8')
+
+    assert run(tmp_path, server) == 0
+    assert local(tmp_path, path).read_bytes() == body
+    headers = next(h for p, h in server.requests if p == path)
+    assert headers['Range'] == 'bytes=1000-'
+    assert headers['If-Range'] == etag
+    assert not part.exists()
+
+
+def test_resume_restarts_when_remote_changed(tmp_path, server):
+    catalogs(tmp_path)
+    path = '/media/uploads/videos/lesson.mp4'
+    part = local(tmp_path, path + '.part')
+    part.parent.mkdir(parents=True)
+    part.write_bytes(b'x' * 1000)
+    local(tmp_path, path + '.part.validator').write_text('"stale"', encoding='utf-8')
+
+    assert run(tmp_path, server) == 0
+    assert local(tmp_path, path).read_bytes() == server.files[path]
+
+
+def test_oversized_partial_download_is_discarded(tmp_path, server):
+    catalogs(tmp_path)
+    path = '/media/uploads/op/pdf/book.pdf'
+    body = server.files[path]
+    part = local(tmp_path, path + '.part')
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body + b'garbage')
+    local(tmp_path, path + '.part.validator').write_text('"%s"' % hashlib.md5(body).hexdigest(), encoding='utf-8')
+
+    assert run(tmp_path, server) == 0
+    assert local(tmp_path, path).read_bytes() == body
+
+
+def test_verify_detects_modified_file(tmp_path, server):
+    catalogs(tmp_path)
+    assert run(tmp_path, server) == 0
+    path = '/media/uploads/op/pdf/book.pdf'
+    body = server.files[path]
+    local(tmp_path, path).write_bytes(b'\0' * len(body))
+
+    server.requests.clear()
+    assert run(tmp_path, server) == 0
+    assert server.requests == []
+
+    assert run(tmp_path, server, '--verify') == 0
+    assert [p for p, _ in server.requests] == [path]
+    assert local(tmp_path, path).read_bytes() == body
+
+
+def test_cancelled_download_keeps_part_for_resume(tmp_path, server):
+    catalogs(tmp_path)
+    path = '/media/uploads/videos/lesson.mp4'
+    body = server.files[path] = os.urandom(mirror_content.CHUNK_SIZE * 3)
+
+    class CancelAfterFirstChunk:
+        calls = 0
+
+        def is_set(self):
+            self.calls += 1
+            return self.calls > 1
+
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    entry = {'path': path.lstrip('/'), 'url': base + path}
+    with pytest.raises(mirror_content.DownloadCancelled):
+        mirror_content.download_file(requests.Session(), entry, str(tmp_path / 'dest'), cancel=CancelAfterFirstChunk())
+    assert local(tmp_path, path + '.part').stat().st_size == mirror_content.CHUNK_SIZE
+    assert local(tmp_path, path + '.part.validator').exists()
+    assert not local(tmp_path, path).exists()
+
+    assert run(tmp_path, server) == 0
+    assert local(tmp_path, path).read_bytes() == body
+    headers = next(h for p, h in server.requests if p == path and 'Range' in h)
+    assert headers['Range'] == 'bytes=%d-' % mirror_content.CHUNK_SIZE
+
+
+def test_requests_are_not_content_encoded(tmp_path, server):
+    catalogs(tmp_path)
+    path = '/media/uploads/op/pdf/book.pdf'
+    body = server.files[path] = b'compressible ' * 1000
+    server.gzip_paths.add(path)
+
+    assert run(tmp_path, server) == 0
+    assert local(tmp_path, path).read_bytes() == body
+    assert all(h['Accept-Encoding'] == 'identity' for _, h in server.requests)
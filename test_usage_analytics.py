@@ -0,0 +1,85 @@
+import threading
+import time
+
+import usage_analytics
+
+
+def events(db_path):
+    conn = usage_analytics.connect(db_path)
+    try:
+        return conn.execute('SELECT content_id, event FROM events ORDER BY rowid').fetchall()
+    finally:
+        conn.close()
+
+
+def test_clicks_are_scored_and_views_are_not(tmp_path):
+    db_path = str(tmp_path / 'analytics.db')
+    now = time.time()
+    conn = usage_analytics.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO events (ts, content_id, event) VALUES (?, ?, ?)', [
+            (now, 'a', 'click'),
+            (now, 'a', 'click'),
+            (now, 'a', 'view'),
+            (now, 'b', 'view'),
+            (now, 'b', 'view'),
+        ])
+    usage_analytics.aggregate_popularity(conn, now=now)
+    conn.close()
+
+    assert usage_analytics.load_popularity(db_path) == {'a': 2.0}
+
+
+def test_events_outside_window_are_ignored(tmp_path):
+    db_path = str(tmp_path / 'analytics.db')
+    now = time.time()
+    day = 86400
+    conn = usage_analytics.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO events (ts, content_id, event) VALUES (?, ?, ?)', [
+            (now - (usage_analytics.POPULARITY_WINDOW_DAYS + 1) * day, 'old', 'click'),
+            (now - (usage_analytics.POPULARITY_WINDOW_DAYS + 1) * day, 'both', 'click'),
+            (now - day, 'both', 'click'),
+        ])
+    usage_analytics.aggregate_popularity(conn, now=now)
+    conn.close()
+
+    assert usage_analytics.load_popularity(db_path) == {'both': 1.0}
+
+
+def test_close_flushes_queue_and_aggregates(tmp_path):
+    db_path = str(tmp_path / 'analytics.db')
+    recorder = usage_analytics.AnalyticsRecorder(db_path=db_path, flush_interval=0.1)
+    recorder.record('a', 'click')
+    recorder.record('', 'click')
+    recorder.record(None, 'click')
+    recorder.record_many(['a', 'b', ''], 'view')
+    recorder.close()
+
+    assert events(db_path) == [('a', 'click'), ('a', 'view'), ('b', 'view')]
+    assert usage_analytics.load_popularity(db_path) == {'a': 1.0}
+
+
+def test_full_queue_drops_events(tmp_path, monkeypatch):
+    # Hold the writer thread before it starts draining so the queue stays full
+    gate = threading.Event()
+    connect = usage_analytics.connect
+
+    def blocked_connect(db_path):
+        gate.wait()
+        return connect(db_path)
+
+    monkeypatch.setattr(usage_analytics, 'connect', blocked_connect)
+    db_path = str(tmp_path / 'analytics.db')
+    recorder = usage_analytics.AnalyticsRecorder(db_path=db_path, flush_interval=0.1, max_queue=2)
+    for content_id in ('a', 'b', 'c', 'd'):
+        recorder.record(content_id, 'click')
+    assert recorder.dropped == 2
+
+    gate.set()
+    recorder.close()
+    assert events(db_path) == [('a', 'click'), ('b', 'click')]
+
+
+def test_load_popularity_without_database(tmp_path):
+    assert usage_analytics.load_popularity(str(tmp_path / 'missing.db')) == {}
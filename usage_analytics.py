@@ -0,0 +1,135 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+# Records content views and clicks without blocking the Streamlit request path.
+#
+# record() only puts the event on an in-process queue. A background thread drains the
+# queue and appends events to SQLite (WAL mode) in batches, and every few minutes
+# aggregates them into a popularity table that the app reads with load_popularity().
+
+DB_PATH = 'usage_analytics.db'
+
+# Event weights used for the popularity score. Views are recorded but not scored: cards are
+# ordered by popularity, so counting impressions would reward whatever is already shown first.
+EVENT_WEIGHTS = {
+    'click': 1.0,
+}
+# Only events from this many days count towards popularity
+POPULARITY_WINDOW_DAYS = 90
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    ts REAL NOT NULL,
+    content_id TEXT NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS popularity (
+    content_id TEXT PRIMARY KEY,
+    score REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def aggregate_popularity(conn, now=None, window_days=POPULARITY_WINDOW_DAYS):
+    # Rebuild the popularity table from recent events in a single transaction
+    now = time.time() if now is None else now
+    weights = ' '.join(f"WHEN '{event}' THEN {weight}" for event, weight in EVENT_WEIGHTS.items())
+    with conn:
+        conn.execute('DELETE FROM popularity')
+        conn.execute(
+            f"""
+            INSERT INTO popularity (content_id, score, updated)
+            SELECT content_id, SUM(CASE event {weights} ELSE 0 END), ?
+            FROM events WHERE ts >= ? AND content_id != ''
+            GROUP BY content_id
+            HAVING SUM(CASE event {weights} ELSE 0 END) > 0
+            """,
+            (now, now - window_days * 86400),
+        )
+
+
+def load_popularity(db_path=DB_PATH):
+    # Returns {content_id: score}; an empty dict if nothing has been recorded yet
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=5)
+    except sqlite3.OperationalError:
+        return {}
+    try:
+        return dict(conn.execute('SELECT content_id, score FROM popularity'))
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+
+class AnalyticsRecorder:
+    def __init__(self, db_path=DB_PATH, batch_size=200, flush_interval=2.0,
+                 aggregate_interval=300.0, max_queue=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.aggregate_interval = aggregate_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='usage-analytics', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, content_id, event):
+        # Never blocks: if the writer falls behind, the event is dropped and counted
+        if not content_id:
+            return
+        try:
+            self._queue.put_nowait((time.time(), str(content_id), event))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_many(self, content_ids, event):
+        for content_id in content_ids:
+            self.record(content_id, event)
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _drain(self, wait):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=wait))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        conn = connect(self.db_path)
+        last_aggregate = 0.0
+        try:
+            while True:
+                stopping = self._stop.is_set()
+                batch = self._drain(0 if stopping else self.flush_interval)
+                if batch:
+                    with conn:
+                        conn.executemany('INSERT INTO events (ts, content_id, event) VALUES (?, ?, ?)', batch)
+                if time.time() - last_aggregate >= self.aggregate_interval or (stopping and not batch):
+                    aggregate_popularity(conn)
+                    last_aggregate = time.time()
+                if stopping and not batch:
+                    break
+        finally:
+            conn.close()